@@ -3,13 +3,19 @@
 DICE: Dependency-Aware Configuration Debloating
 """
 
+import hashlib
 import json
 import os
 import subprocess
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
 
 import kconfiglib
 import networkx as nx
@@ -22,23 +28,115 @@ class ValidationResult(Enum):
     BOOT_FAIL = "boot_fail"
     RUNTIME_FAIL = "runtime_fail"
 
-@dataclass
+@dataclass(slots=True)
 class ConfigCandidate:
     """Represents a configuration candidate for testing"""
-    config: Dict[str, str]  # symbol -> value mapping
+    base: Dict[str, str]  # shared base symbol -> value mapping, never mutated
+    overrides: Dict[str, str] = field(default_factory=dict)  # symbol -> value applied on top of base
     disabled_symbols: Set[str] = field(default_factory=set)
     validation_result: Optional[ValidationResult] = None
     build_time: Optional[float] = None
     size_reduction: Optional[float] = None
 
+    def full_config(self) -> Dict[str, str]:
+        """Materialize the complete symbol -> value mapping"""
+        config = self.base.copy()
+        config.update(self.overrides)
+        return config
+
+def _merge_intervals(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Merge overlapping or adjacent inclusive integer ranges"""
+    spans.sort()
+    merged = [spans[0]]
+    for start, end in spans[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            if end > last_end:
+                merged[-1] = (last_start, end)
+        else:
+            merged.append((start, end))
+    return merged
+
+def _tarjan_scc(indptr: array, indices: array) -> Tuple[array, int]:
+    """Iterative Tarjan SCC over a CSR graph: (component id per node, #components)
+
+    Components are numbered in completion order, i.e. reverse topological order
+    of the condensation (an edge between components always points to a lower id).
+    """
+    n = len(indptr) - 1
+    order = [-1] * n  # DFS discovery index
+    low = [0] * n
+    on_stack = [False] * n
+    comp = array("i", [-1]) * n
+    stack = []
+    counter = 0
+    n_comp = 0
+
+    for root in range(n):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        # (node, next edge position in indices)
+        work = [(root, indptr[root])]
+        while work:
+            v, pos = work[-1]
+            end = indptr[v + 1]
+            while pos < end:
+                w = indices[pos]
+                pos += 1
+                if order[w] == -1:
+                    work[-1] = (v, pos)
+                    order[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, indptr[w]))
+                    break
+                if on_stack[w] and order[w] < low[v]:
+                    low[v] = order[w]
+            else:
+                work.pop()
+                if low[v] == order[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        comp[w] = n_comp
+                        if w == v:
+                            break
+                    n_comp += 1
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+
+    return comp, n_comp
+
 class DependencyAnalyzer:
     """Analyzes Kconfig dependency relationships using kconfiglib"""
 
     def __init__(self, kconfig: kconfiglib.Kconfig):
         self.kconfig = kconfig
+        self._expr_items_cache: Dict[int, Tuple[str, ...]] = {}
         self.dep_graph = self._build_dependency_graph()
-        self.reverse_deps = self._build_reverse_dependencies()
+        self._dependents_cache: Dict[str, FrozenSet[str]] = {}
+        self._dependencies_cache: Dict[str, FrozenSet[str]] = {}
+        # Flat int adjacency (CSR) for index-based hot queries
+        self.names, self._index, self._indptr, self._indices = self._build_csr()
+        # SCCs via Tarjan on the CSR arrays; transitive queries run on the
+        # condensation DAG (one node per SCC)
+        self._scc_of, n_scc = _tarjan_scc(self._indptr, self._indices)
+        (self._scc_members, self._scc_cyclic,
+         self._cond_indptr, self._cond_indices) = self._build_condensation(n_scc)
+        (self._post, self._post_to_scc,
+         self._iv_ptr, self._iv_start, self._iv_end) = self._build_reach_intervals()
         self.choice_groups = self._extract_choice_groups()
+        self.selected_by: Dict[str, FrozenSet[str]] = {
+            target: frozenset(selectors)
+            for target, selectors in self._build_selected_by_map().items()
+        }
 
     def _build_dependency_graph(self) -> nx.DiGraph:
         """Build directed graph of symbol dependencies"""
@@ -63,17 +161,15 @@ class DependencyAnalyzer:
         """Add all dependency relationships for a symbol"""
 
         # Direct dependencies (depends on)
-        for dep_sym in kconfiglib.expr_items(sym.direct_dep):
-            if isinstance(dep_sym, kconfiglib.Symbol) and not dep_sym.is_constant:
-                G.add_edge(dep_sym.name, sym.name, type="depends_on")
+        for dep_name in self._expr_symbols(sym.direct_dep):
+            G.add_edge(dep_name, sym.name, type="depends_on")
 
         # Select relationships
         for select_sym, cond in sym.selects:
             G.add_edge(sym.name, select_sym.name, type="select")
             # Add condition dependencies
-            for cond_sym in kconfiglib.expr_items(cond):
-                if isinstance(cond_sym, kconfiglib.Symbol) and not cond_sym.is_constant:
-                    G.add_edge(cond_sym.name, sym.name, type="select_condition")
+            for cond_name in self._expr_symbols(cond):
+                G.add_edge(cond_name, sym.name, type="select_condition")
 
         # Imply relationships
         for imply_sym, cond in sym.implies:
@@ -84,16 +180,158 @@ class DependencyAnalyzer:
             choice_id = f"choice_{id(sym.choice)}"
             G.add_edge(choice_id, sym.name, type="choice_member")
 
-    def _build_reverse_dependencies(self) -> Dict[str, Set[str]]:
-        """Build reverse dependency mapping for fast lookups"""
-        reverse_deps = {}
-        for node in self.dep_graph.nodes():
-            reverse_deps[node] = set()
-
-        for source, target, data in self.dep_graph.edges(data=True):
-            reverse_deps[target].add(source)
+    def _build_csr(self) -> Tuple[List[str], Dict[str, int], array, array]:
+        """Convert the graph's successor lists once into CSR int arrays"""
+        names = list(self.dep_graph.nodes())
+        index = {name: i for i, name in enumerate(names)}
+        indptr = array("i", [0])
+        indices = array("i")
+        for name in names:
+            indices.extend(index[succ] for succ in self.dep_graph.successors(name))
+            indptr.append(len(indices))
+        return names, index, indptr, indices
+
+    def symbol_index(self, symbol: str) -> Optional[int]:
+        """Integer index of a graph node (see names), or None if absent"""
+        return self._index.get(symbol)
+
+    def get_dependents_idx(self, i: int) -> memoryview:
+        """Indices of the direct dependents of node i (zero-copy view)"""
+        return memoryview(self._indices)[self._indptr[i]:self._indptr[i + 1]]
+
+    def _expr_symbols(self, expr) -> Tuple[str, ...]:
+        """Names of the non-constant symbols in an expression, cached per expression object"""
+        # Kconfig shares expression objects (e.g. the constant 'y' and common
+        # depends-on trees), and all of them live as long as the Kconfig instance
+        key = id(expr)
+        names = self._expr_items_cache.get(key)
+        if names is None:
+            names = tuple(item.name for item in kconfiglib.expr_items(expr)
+                          if isinstance(item, kconfiglib.Symbol) and not item.is_constant)
+            self._expr_items_cache[key] = names
+        return names
+
+    def _build_condensation(self, n_scc: int) -> Tuple[List[Set[str]], List[bool], array, array]:
+        """Per SCC: its members and whether it contains a cycle, plus the condensation DAG as CSR"""
+        names, indptr, indices, scc_of = self.names, self._indptr, self._indices, self._scc_of
+        members: List[Set[str]] = [set() for _ in range(n_scc)]
+        cyclic = [False] * n_scc
+        succs: List[Set[int]] = [set() for _ in range(n_scc)]
+        for i in range(len(names)):
+            scc = scc_of[i]
+            members[scc].add(names[i])
+            for j in indices[indptr[i]:indptr[i + 1]]:
+                target = scc_of[j]
+                if target != scc:
+                    succs[scc].add(target)
+                elif j == i:
+                    cyclic[scc] = True  # self-loop
+        for scc in range(n_scc):
+            if len(members[scc]) > 1:
+                cyclic[scc] = True
+
+        cond_indptr = array("i", [0])
+        cond_indices = array("i")
+        for scc in range(n_scc):
+            cond_indices.extend(succs[scc])
+            cond_indptr.append(len(cond_indices))
+        return members, cyclic, cond_indptr, cond_indices
+
+    def _scc_successors(self, scc: int) -> array:
+        """Successor SCCs of scc in the condensation DAG"""
+        return self._cond_indices[self._cond_indptr[scc]:self._cond_indptr[scc + 1]]
+
+    def _scc_of_symbol(self, symbol: str) -> Optional[int]:
+        """SCC id of a graph node, or None if absent"""
+        i = self._index.get(symbol)
+        return None if i is None else self._scc_of[i]
+
+    def _build_reach_intervals(self) -> Tuple[array, array, array, array, array]:
+        """Compressed transitive closure of the condensation DAG
+
+        SCCs are numbered in DFS post-order over a spanning forest, so each
+        tree subtree is one contiguous range. The SCCs reachable from a node
+        (itself included) are the merged union of its own subtree range and
+        the ranges of its successors; on a DAG every successor finishes first.
+        """
+        k = len(self._scc_members)
+        successors = self._scc_successors
+        post = array("i", [0] * k)
+        post_to_scc = array("i", [0] * k)
+        intervals: List[List[Tuple[int, int]]] = [[] for _ in range(k)]
+        visited = [False] * k
+        counter = 0
+
+        for root in range(k):
+            if visited[root]:
+                continue
+            visited[root] = True
+            # (node, first post number in its subtree, pending children)
+            stack = [(root, counter, iter(successors(root)))]
+            while stack:
+                node, low, children = stack[-1]
+                for child in children:
+                    if not visited[child]:
+                        visited[child] = True
+                        stack.append((child, counter, iter(successors(child))))
+                        break
+                else:
+                    stack.pop()
+                    post[node] = counter
+                    post_to_scc[counter] = node
+                    spans = [(low, counter)]
+                    for child in successors(node):
+                        spans.extend(intervals[child])
+                    intervals[node] = _merge_intervals(spans)
+                    counter += 1
+
+        iv_ptr = array("i", [0])
+        iv_start = array("i")
+        iv_end = array("i")
+        for scc in range(k):
+            for start, end in intervals[scc]:
+                iv_start.append(start)
+                iv_end.append(end)
+            iv_ptr.append(len(iv_start))
+        return post, post_to_scc, iv_ptr, iv_start, iv_end
+
+    def _reachable_sccs(self, sccs) -> Set[int]:
+        """SCCs reachable in one or more steps from any of the given SCCs"""
+        reached = set()
+        for scc in sccs:
+            if self._scc_cyclic[scc]:
+                # Members of a cycle reach each other, including themselves
+                reached.add(scc)
+            for succ in self._scc_successors(scc):
+                for k in range(self._iv_ptr[succ], self._iv_ptr[succ + 1]):
+                    reached.update(self._post_to_scc[self._iv_start[k]:self._iv_end[k] + 1])
+        return reached
+
+    def _expand_sccs(self, sccs: Set[int]) -> Set[str]:
+        """Map SCC ids back to their member symbols"""
+        symbols = set()
+        for scc in sccs:
+            symbols.update(self._scc_members[scc])
+        return symbols
 
-        return reverse_deps
+    def reaches(self, u: str, v: str) -> bool:
+        """Whether v is u or (transitively) depends on u"""
+        cu = self._scc_of_symbol(u)
+        cv = self._scc_of_symbol(v)
+        if cu is None or cv is None:
+            return False
+        if cu == cv:
+            return u == v or self._scc_cyclic[cu]
+        p = self._post[cv]
+        lo, hi = self._iv_ptr[cu], self._iv_ptr[cu + 1]
+        i = bisect_right(self._iv_start, p, lo, hi) - 1
+        return i >= lo and p <= self._iv_end[i]
+
+    @property
+    def reverse_deps(self):
+        """Read-only reverse dependency mapping (node -> predecessors view)"""
+        # DiGraph already maintains the predecessor adjacency; no rebuild needed
+        return self.dep_graph.pred
 
     def _extract_choice_groups(self) -> Dict[str, List[str]]:
         """Extract choice groups and their members"""
@@ -114,21 +352,33 @@ class DependencyAnalyzer:
                 selected_by[target_sym.name].add(sym.name)
         return selected_by
 
-    def get_dependents(self, symbol: str) -> Set[str]:
+    def get_dependents(self, symbol: str) -> FrozenSet[str]:
         """Get all symbols that depend on the given symbol"""
-        if symbol not in self.dep_graph:
-            return set()
-        return set(self.dep_graph.successors(symbol))
-
-    def get_dependencies(self, symbol: str) -> Set[str]:
+        # The graph is immutable after construction, so results are memoized
+        deps = self._dependents_cache.get(symbol)
+        if deps is None:
+            deps = frozenset(self.dep_graph.successors(symbol)) if symbol in self.dep_graph else frozenset()
+            self._dependents_cache[symbol] = deps
+        return deps
+
+    def get_dependencies(self, symbol: str) -> FrozenSet[str]:
         """Get all symbols that the given symbol depends on"""
+        deps = self._dependencies_cache.get(symbol)
+        if deps is None:
+            deps = frozenset(self.dep_graph.predecessors(symbol)) if symbol in self.dep_graph else frozenset()
+            self._dependencies_cache[symbol] = deps
+        return deps
+
+    def get_dependents_transitive(self, symbol: str) -> Set[str]:
+        """Get all symbols that directly or indirectly depend on the given symbol"""
         if symbol not in self.dep_graph:
             return set()
-        return set(self.dep_graph.predecessors(symbol))
+        return self._expand_sccs(self._reachable_sccs([self._scc_of_symbol(symbol)]))
 
-    def find_strongly_connected_components(self) -> List[Set[str]]:
-        """Find dependency cycles (SCCs) in the configuration"""
-        return [set(scc) for scc in nx.strongly_connected_components(self.dep_graph)]
+    def find_strongly_connected_components(self) -> Iterator[Set[str]]:
+        """Lazily yield dependency cycles (SCCs with more than one symbol)"""
+        # Reuse the Tarjan SCCs; trivial singletons are never copied
+        return (set(members) for members in self._scc_members if len(members) > 1)
 
     def compute_removal_impact(self, symbols: Set[str]) -> Dict[str, Set[str]]:
         """Compute what would be affected by removing given symbols"""
@@ -148,18 +398,9 @@ class DependencyAnalyzer:
                 if symbol in members and len([m for m in members if m not in symbols]) == 0:
                     impact["choice_conflicts"].add(choice_id)
 
-        # Compute transitive closure
-        all_affected = impact["directly_affected"].copy()
-        worklist = list(impact["directly_affected"])
-
-        while worklist:
-            current = worklist.pop()
-            deps = self.get_dependents(current)
-            new_deps = deps - all_affected
-            all_affected.update(new_deps)
-            worklist.extend(new_deps)
-
-        impact["transitively_affected"] = all_affected
+        # Compute transitive closure from the precomputed reachability intervals
+        sources = {self._scc_of_symbol(symbol) for symbol in symbols if symbol in self.dep_graph}
+        impact["transitively_affected"] = self._expand_sccs(self._reachable_sccs(sources))
         return impact
 
 class ConfigValidator:
@@ -171,44 +412,178 @@ class ConfigValidator:
         self.build_dir = Path(build_dir) if build_dir else self.kernel_path / "build"
         self.boot_test_cmd = boot_test_cmd
         self.runtime_test_cmd = runtime_test_cmd
+        self.build_jobs = os.cpu_count()
+        self._kconf = None
+        self._string_syms: Optional[Set[str]] = None
+        self._last_config_hash: Optional[str] = None  # requested config behind the current .config
+
+        # Validation is deterministic in the config content, so results are memoized
+        self._result_cache: Dict[bytes, ValidationResult] = {}
+        self._result_cache_path: Optional[Path] = None
+        self._cache_identity_data: Optional[Dict[str, str]] = None
+        self._cache_lock = threading.Lock()
+
+    def clone(self, build_dir_suffix, build_jobs: int = None) -> "ConfigValidator":
+        """Return a validator with the same tests but its own build directory"""
+        validator = ConfigValidator(str(self.kernel_path),
+                                    str(self.build_dir.with_name(f"{self.build_dir.name}_{build_dir_suffix}")),
+                                    self.boot_test_cmd, self.runtime_test_cmd)
+        if build_jobs:
+            validator.build_jobs = build_jobs
+        # Clones share one result cache
+        validator._result_cache = self._result_cache
+        validator._result_cache_path = self._result_cache_path
+        validator._cache_identity_data = self._cache_identity_data
+        validator._cache_lock = self._cache_lock
+        return validator
+
+    def _kernel_id(self) -> str:
+        """Identify the kernel tree: git HEAD if it is a checkout, else its Makefile version"""
+        # Only trust git for a checkout rooted at the kernel tree, not an enclosing repo
+        if (self.kernel_path / ".git").exists():
+            try:
+                result = subprocess.run(["git", "-C", str(self.kernel_path), "rev-parse", "HEAD"],
+                                        capture_output=True, text=True, timeout=30)
+                if result.returncode == 0:
+                    return result.stdout.strip()
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+
+        keys = ("VERSION", "PATCHLEVEL", "SUBLEVEL", "EXTRAVERSION")
+        version = {}
+        try:
+            with open(self.kernel_path / "Makefile") as f:
+                for line in f:
+                    key, sep, value = line.partition("=")
+                    if sep and key.strip() in keys:
+                        version[key.strip()] = value.strip()
+                    if len(version) == len(keys):
+                        break
+        except OSError:
+            pass
+        return "{}.{}.{}{}".format(*(version.get(k, "") for k in keys))
+
+    def _cache_identity(self) -> Dict[str, str]:
+        """Inputs besides the config that a persisted result cache is only valid for"""
+        return {
+            "kernel": self._kernel_id(),
+            "kconfiglib": ".".join(map(str, kconfiglib.VERSION)),
+        }
+
+    def load_result_cache(self, path: str):
+        """Persist validation results to path, reusing results saved for the same kernel"""
+        self._result_cache_path = Path(path)
+        self._cache_identity_data = self._cache_identity()
+        try:
+            with open(self._result_cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        if data.get("identity") != self._cache_identity_data:
+            print(f"Ignoring result cache {path}: built for a different kernel/kconfiglib")
+            return
+        for key, value in data.get("results", {}).items():
+            self._result_cache[bytes.fromhex(key)] = ValidationResult(value)
+        print(f"Loaded {len(self._result_cache)} cached validation results from {path}")
+
+    def _save_result_cache(self):
+        data = {
+            "identity": self._cache_identity_data,
+            "results": {key.hex(): result.value for key, result in self._result_cache.items()},
+        }
+        tmp_path = self._result_cache_path.with_name(self._result_cache_path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._result_cache_path)
+
+    def _result_key(self, candidate: ConfigCandidate) -> bytes:
+        """Digest of everything the validation outcome depends on"""
+        payload = json.dumps([sorted(candidate.full_config().items()),
+                              self.boot_test_cmd, self.runtime_test_cmd])
+        return hashlib.blake2b(payload.encode(), digest_size=16).digest()
+
+    def _get_kconf(self) -> kconfiglib.Kconfig:
+        """Return the parsed Kconfig tree, reset to defaults (parsed once per validator)"""
+        if self._kconf is None:
+            os.environ.setdefault("srctree", str(self.kernel_path))
+            self._kconf = kconfiglib.Kconfig(filename=str(self.kernel_path / "Kconfig"),
+                                             suppress_traceback=True)
+        else:
+            # Drop overrides left behind by the previous candidate
+            self._kconf.unset_values()
+        return self._kconf
+
+    def _get_string_symbols(self) -> Set[str]:
+        """CONFIG_ names of string symbols, whose .config values must be quoted"""
+        if self._string_syms is None:
+            if self._kconf is None:
+                self._get_kconf()
+            self._string_syms = {f"CONFIG_{sym.name}" for sym in self._kconf.unique_defined_syms
+                                 if sym.orig_type == kconfiglib.STRING}
+        return self._string_syms
 
     def validate_config(self, candidate: ConfigCandidate) -> ValidationResult:
         """Full validation pipeline: config -> build -> boot -> runtime"""
+        key = self._result_key(candidate)
+        cached = self._result_cache.get(key)
+        if cached is not None:
+            candidate.validation_result = cached
+            return cached
+
+        result, conclusive = self._run_validation(candidate)
+        # A timeout or error says nothing about the config itself (missing
+        # make, full disk, hung boot harness), so only conclusive results are kept
+        if conclusive:
+            with self._cache_lock:
+                self._result_cache[key] = result
+                if self._result_cache_path:
+                    self._save_result_cache()
+        return result
+
+    def _run_validation(self, candidate: ConfigCandidate) -> Tuple[ValidationResult, bool]:
+        """Run every validation stage for a candidate: (result, whether it is conclusive)
+
+        Each stage returns True (passed), False (failed) or None (could not be
+        run to completion); a None fails the candidate but is not conclusive.
+        """
 
         # Stage 1: Validate Kconfig constraints
-        if not self._validate_kconfig_constraints(candidate):
+        passed = self._validate_kconfig_constraints(candidate)
+        if not passed:
             candidate.validation_result = ValidationResult.INVALID_CONFIG
-            return ValidationResult.INVALID_CONFIG
+            return ValidationResult.INVALID_CONFIG, passed is not None
 
         # Stage 2: Test build
-        if not self._test_build(candidate):
+        passed = self._test_build(candidate)
+        if not passed:
             candidate.validation_result = ValidationResult.BUILD_FAIL
-            return ValidationResult.BUILD_FAIL
+            return ValidationResult.BUILD_FAIL, passed is not None
 
         # Stage 3: Test boot (if configured)
-        if self.boot_test_cmd and not self._test_boot(candidate):
+        passed = self._test_boot(candidate)
+        if not passed:
             candidate.validation_result = ValidationResult.BOOT_FAIL
-            return ValidationResult.BOOT_FAIL
+            return ValidationResult.BOOT_FAIL, passed is not None
 
         # Stage 4: Test runtime (if configured)
-        if self.runtime_test_cmd and not self._test_runtime(candidate):
+        passed = self._test_runtime(candidate)
+        if not passed:
             candidate.validation_result = ValidationResult.RUNTIME_FAIL
-            return ValidationResult.RUNTIME_FAIL
+            return ValidationResult.RUNTIME_FAIL, passed is not None
 
         candidate.validation_result = ValidationResult.SUCCESS
-        return ValidationResult.SUCCESS
+        return ValidationResult.SUCCESS, True
 
-    def _validate_kconfig_constraints(self, candidate: ConfigCandidate) -> bool:
+    def _validate_kconfig_constraints(self, candidate: ConfigCandidate) -> Optional[bool]:
         """Validate that configuration satisfies Kconfig constraints"""
         try:
-            # Parse Kconfig for the target kernel tree
-            os.environ.setdefault("srctree", str(self.kernel_path))
-            kconf = kconfiglib.Kconfig(filename=str(self.kernel_path / "Kconfig"),
-                                    suppress_traceback=True)
+            # Reuse the parsed Kconfig for the target kernel tree
+            kconf = self._get_kconf()
 
             # Apply candidate values directly via kconfiglib
             attempted = []
-            for full, val in candidate.config.items():
+            for full, val in candidate.full_config().items():
                 # full is like "CONFIG_FOO"
                 name = full[7:] if full.startswith("CONFIG_") else full
                 sym = kconf.syms.get(name)
@@ -225,85 +600,108 @@ class ConfigValidator:
 
         except Exception as e:
             print(f"Kconfig validation error: {e}")
-            return False
+            return None
 
-    def _test_build(self, candidate: ConfigCandidate) -> bool:
+    def _test_build(self, candidate: ConfigCandidate) -> Optional[bool]:
         """Test if configuration builds successfully"""
         try:
             # Create build directory
             self.build_dir.mkdir(parents=True, exist_ok=True)
 
-            # Produce a correct .config using kconfiglib
-            os.environ.setdefault("srctree", str(self.kernel_path))
-            kconf = kconfiglib.Kconfig(filename=str(self.kernel_path / "Kconfig"),
-                                    suppress_traceback=True)
-
-            # Start from empty; apply only our intended overrides
-            for full, val in candidate.config.items():
-                name = full[7:] if full.startswith("CONFIG_") else full
-                sym = kconf.syms.get(name)
-                if sym:
-                    sym.set_value(val)
+            # Format the candidate's assignments directly; olddefconfig fills in
+            # everything else, so kconfiglib need not evaluate the whole tree here
+            string_syms = self._get_string_symbols()
+            lines = []
+            append = lines.append
+            for full, val in candidate.full_config().items():
+                if val == "n":
+                    append(f"# {full} is not set\n")
+                elif full in string_syms:
+                    append(f'{full}="{kconfiglib.escape(val)}"\n')
+                else:
+                    append(f"{full}={val}\n")
+            contents = "".join(lines)
+            config_hash = hashlib.sha256(contents.encode()).hexdigest()
 
             config_path = self.build_dir / ".config"
-            kconf.write_config(str(config_path))
+            stamp_path = self.build_dir / ".dice_config_hash"
+            if self._last_config_hash is None and stamp_path.exists():
+                self._last_config_hash = stamp_path.read_text().strip()
+
+            # Same requested config as the normalized .config in place: leave it
+            # (and kbuild's include/config stamps) alone and skip olddefconfig
+            if config_hash != self._last_config_hash or not config_path.exists():
+                self._last_config_hash = None
+                stamp_path.unlink(missing_ok=True)
+                with open(config_path, "w", buffering=1 << 20) as f:
+                    f.write(contents)
+
+                # Normalize with olddefconfig
+                cmd = ["make", f"O={self.build_dir}", "-C", str(self.kernel_path), "olddefconfig"]
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+                if result.returncode != 0:
+                    return False
 
-            # Normalize with olddefconfig
-            cmd = ["make", f"O={self.build_dir}", "-C", str(self.kernel_path), "olddefconfig"]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-            if result.returncode != 0:
-                return False
+                stamp_path.write_text(config_hash)
+                self._last_config_hash = config_hash
 
             # Build kernel
             import time
             start_time = time.time()
-            cmd = ["make", f"O={self.build_dir}", "-C", str(self.kernel_path), "-j", str(os.cpu_count())]
+            cmd = ["make", "-s", f"O={self.build_dir}", "-C", str(self.kernel_path), "-j", str(self.build_jobs), "-l", str(os.cpu_count())]
             result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)
             candidate.build_time = time.time() - start_time
 
             return result.returncode == 0
 
         except subprocess.TimeoutExpired:
-            return False
+            return None
         except Exception as e:
             print(f"Build test error: {e}")
-            return False
+            return None
+
+    def _test_env(self) -> Dict[str, str]:
+        """Environment for boot/runtime test commands, pointing them at this validator's build"""
+        # Parallel clones each build into their own directory, so the test
+        # commands must not assume a fixed kernel image location
+        return {**os.environ, "DICE_BUILD_DIR": str(self.build_dir)}
 
-    def _test_boot(self, candidate: ConfigCandidate) -> bool:
+    def _test_boot(self, candidate: ConfigCandidate) -> Optional[bool]:
         """Test if kernel boots successfully"""
         if not self.boot_test_cmd:
             return True
 
         try:
-            result = subprocess.run(self.boot_test_cmd, shell=True,
+            result = subprocess.run(self.boot_test_cmd, shell=True, env=self._test_env(),
                                   capture_output=True, text=True, timeout=600)
             return result.returncode == 0
         except subprocess.TimeoutExpired:
-            return False
+            return None
         except Exception as e:
             print(f"Boot test error: {e}")
-            return False
+            return None
 
-    def _test_runtime(self, candidate: ConfigCandidate) -> bool:
+    def _test_runtime(self, candidate: ConfigCandidate) -> Optional[bool]:
         """Test runtime functionality"""
         if not self.runtime_test_cmd:
             return True
 
         try:
-            result = subprocess.run(self.runtime_test_cmd, shell=True,
+            result = subprocess.run(self.runtime_test_cmd, shell=True, env=self._test_env(),
                                   capture_output=True, text=True, timeout=1800)
             return result.returncode == 0
         except subprocess.TimeoutExpired:
-            return False
+            return None
         except Exception as e:
             print(f"Runtime test error: {e}")
-            return False
+            return None
 
 class DICEDebloater:
     """Main DICE implementation for kernel configuration debloating"""
 
-    def __init__(self, kernel_path: str, base_config: str = None):
+    def __init__(self, kernel_path: str, base_config: str = None, jobs: int = 1):
         self.kernel_path = Path(kernel_path)
+        self.jobs = max(1, jobs)  # candidates validated in parallel
 
         # # Initialize kconfiglib
         # os.chdir(kernel_path)
@@ -329,13 +727,16 @@ class DICEDebloater:
         # Track results
         self.tested_configs = []
         self.best_config = None
+        self._disabled: Set[str] = set()  # bare symbol names removed so far
+        self._enabled_y: Set[str] = set()  # bare symbol names currently set to y
 
     def get_current_config(self) -> Dict[str, str]:
         """Get current configuration as symbol->value mapping"""
         config = {}
         for sym in self.kconfig.unique_defined_syms:
             if sym.str_value != "n":
-                config[f"CONFIG_{sym.name}"] = sym.str_value
+                # Interned so every candidate config shares identical key objects
+                config[sys.intern(f"CONFIG_{sym.name}")] = sym.str_value
         return config
 
     def identify_removal_candidates(self) -> List[Tuple[str, Set[str]]]:
@@ -345,15 +746,14 @@ class DICEDebloater:
         # Find leaf nodes (no dependents) - safest to remove
         for sym in self.kconfig.unique_defined_syms:
             if sym.str_value != "n":
-                dependents = self.analyzer.get_dependents(sym.name)
+                dependents = self.analyzer.get_dependents_idx(self.analyzer.symbol_index(sym.name))
                 if not dependents:
                     candidates.append((f"leaf_{sym.name}", {sym.name}))
 
         # Find weakly connected components
         sccs = self.analyzer.find_strongly_connected_components()
         for i, scc in enumerate(sccs):
-            if len(scc) > 1:  # Actual cycle
-                candidates.append((f"scc_{i}", scc))
+            candidates.append((f"scc_{i}", scc))
 
         # Find subsystem clusters based on menu hierarchy
         node = self.kconfig.top_node.list
@@ -367,16 +767,22 @@ class DICEDebloater:
         return candidates
 
     def _get_menu_symbols(self, menu_node) -> Set[str]:
-        """Recursively get all symbols under a menu"""
+        """Get all symbols under a menu, including nested menus"""
         symbols = set()
-
-        current = menu_node.list
-        while current:
-            if isinstance(current.item, kconfiglib.Symbol):
-                symbols.add(current.item.name)
-            elif current.item == kconfiglib.MENU:
-                symbols.update(self._get_menu_symbols(current))
-            current = current.next
+        Symbol = kconfiglib.Symbol
+        MENU = kconfiglib.MENU
+
+        # Iterative walk; each stack entry is the first child of a pending menu
+        stack = [menu_node.list]
+        while stack:
+            current = stack.pop()
+            while current:
+                item = current.item
+                if isinstance(item, Symbol):
+                    symbols.add(item.name)
+                elif item == MENU and current.list:
+                    stack.append(current.list)
+                current = current.next
 
         return symbols
 
@@ -386,7 +792,7 @@ class DICEDebloater:
 
         # Start with current configuration
         base_config = self.get_current_config()
-        best_candidate = ConfigCandidate(config=base_config.copy())
+        best_candidate = ConfigCandidate(base=base_config)
 
         # Validate base configuration
         print("Validating base configuration...")
@@ -401,16 +807,35 @@ class DICEDebloater:
         candidates = self.identify_removal_candidates()
         print(f"Found {len(candidates)} removal candidate groups")
 
+        # Only symbols enabled in the base config can still be removed; groups
+        # without any are dropped up front, the rest once fully disabled
+        self._disabled = set()
+        self._enabled_y = {full[7:] for full, val in base_config.items() if val == "y"}
+        remaining = []
+        for candidate_name, symbols_to_remove in candidates:
+            live = frozenset(sym for sym in symbols_to_remove if f"CONFIG_{sym}" in base_config)
+            if live:
+                remaining.append((candidate_name, symbols_to_remove, live))
+
+        # One validator (and build directory) per parallel candidate build
+        if self.jobs > 1:
+            validators = [self.validator.clone(i, build_jobs=max(1, (os.cpu_count() or 1) // self.jobs))
+                          for i in range(self.jobs)]
+        else:
+            validators = [self.validator]
+
         # Iterative removal with backtracking
         for iteration in range(max_iterations):
             print(f"\nIteration {iteration + 1}/{max_iterations}")
 
-            # Try each candidate group
+            # Try each candidate group that still has live symbols
             improved = False
-            for candidate_name, symbols_to_remove in candidates:
+            remaining = [c for c in remaining if not c[2] <= self._disabled]
+            batch = []
+            for candidate_name, symbols_to_remove, live in remaining:
 
                 # Skip if symbols already removed
-                if all(sym not in self.best_config.config for sym in symbols_to_remove):
+                if live <= self._disabled:
                     continue
 
                 print(f"  Testing removal of {candidate_name}: {len(symbols_to_remove)} symbols")
@@ -418,55 +843,28 @@ class DICEDebloater:
                 # Skip removal if any symbol is selected by an enabled selector
                 skip = False
                 for sym in symbols_to_remove:
-                    if sym in self.analyzer.selected_by:
-                        for selector in self.analyzer.selected_by[sym]:
-                            selector_key = f"CONFIG_{selector}"
-                            if selector_key in self.best_config.config and self.best_config.config[selector_key] == "y":
-                                print(f"    SKIP: {sym} is selected by enabled symbol {selector}")
-                                skip = True
-                                break
-                    if skip:
+                    enabled_selectors = self.analyzer.selected_by.get(sym, frozenset()) & self._enabled_y
+                    if enabled_selectors:
+                        print(f"    SKIP: {sym} is selected by enabled symbol {next(iter(enabled_selectors))}")
+                        skip = True
                         break
                 if skip:
                     continue
 
                 # Create new candidate
-                new_config = self.best_config.config.copy()
-                removed_symbols = set()
-
-                for sym in symbols_to_remove:
-                    config_sym = f"CONFIG_{sym}" if not sym.startswith("CONFIG_") else sym
-                    # Force-disable explicitly so Kconfig can't re-enable via defaults/selects
-                    new_config[config_sym] = "n"
-                    removed_symbols.add(config_sym)
-
+                candidate, removed_symbols = self._make_removal_candidate(symbols_to_remove, self.best_config)
                 if not removed_symbols:
                     continue
 
-                candidate = ConfigCandidate(
-                    config=new_config,
-                    disabled_symbols=self.best_config.disabled_symbols | removed_symbols
-                )
-
-                # Validate candidate
-                result = self.validator.validate_config(candidate)
-                self.tested_configs.append(candidate)
-
-                print(f"    Result: {result.value}")
+                batch.append((candidate_name, symbols_to_remove, candidate, removed_symbols))
+                if len(batch) == len(validators):
+                    improved = self._validate_batch(batch, validators)
+                    batch = []
+                    if improved:
+                        break
 
-                if result == ValidationResult.SUCCESS:
-                    # Found improvement
-                    reduction = len(removed_symbols)
-                    candidate.size_reduction = reduction
-                    print(f"    SUCCESS: Removed {reduction} symbols")
-                    self.best_config = candidate
-                    improved = True
-                    break
-                else:
-                    # Try removing smaller subsets if this was a large group
-                    if len(symbols_to_remove) > 5:
-                        print("    Large group failed, trying bisection...")
-                        self._try_bisection_removal(symbols_to_remove, self.best_config)
+            if batch and not improved:
+                improved = self._validate_batch(batch, validators)
 
             if not improved:
                 print("No improvements found, search complete.")
@@ -474,6 +872,66 @@ class DICEDebloater:
 
         return self.best_config
 
+    def _make_removal_candidate(self, symbols: Set[str],
+                                base_candidate: ConfigCandidate) -> Tuple[ConfigCandidate, Set[str]]:
+        """Derive a candidate from base_candidate with the given symbols disabled"""
+        overrides = base_candidate.overrides.copy()
+        removed_symbols = set()
+
+        for sym in symbols:
+            config_sym = sys.intern(f"CONFIG_{sym}" if not sym.startswith("CONFIG_") else sym)
+            # Force-disable explicitly so Kconfig can't re-enable via defaults/selects
+            overrides[config_sym] = "n"
+            removed_symbols.add(config_sym)
+
+        candidate = ConfigCandidate(
+            base=base_candidate.base,
+            overrides=overrides,
+            disabled_symbols=base_candidate.disabled_symbols | removed_symbols
+        )
+        return candidate, removed_symbols
+
+    def _validate_batch(self, batch: List[Tuple[str, Set[str], ConfigCandidate, Set[str]]],
+                        validators: List[ConfigValidator]) -> bool:
+        """Validate a batch of candidates in parallel and accept the best success"""
+        candidates = [candidate for _, _, candidate, _ in batch]
+        if len(batch) == 1:
+            results = [validators[0].validate_config(candidates[0])]
+        else:
+            # Builds run in make subprocesses, so threads are enough to overlap them
+            with ThreadPoolExecutor(max_workers=len(batch)) as pool:
+                results = list(pool.map(ConfigValidator.validate_config, validators, candidates))
+
+        best = None
+        for (candidate_name, _, candidate, removed_symbols), result in zip(batch, results):
+            self.tested_configs.append(candidate)
+            print(f"    Result for {candidate_name}: {result.value}")
+            if result == ValidationResult.SUCCESS:
+                candidate.size_reduction = len(removed_symbols)
+                if best is None or candidate.size_reduction > best[0].size_reduction:
+                    best = (candidate, removed_symbols)
+
+        if best:
+            # Found improvement
+            candidate, removed_symbols = best
+            print(f"    SUCCESS: Removed {candidate.size_reduction} symbols")
+            self._accept(candidate, removed_symbols)
+            return True
+
+        # Try removing smaller subsets of the large groups that failed
+        for candidate_name, symbols_to_remove, _, _ in batch:
+            if len(symbols_to_remove) > 5:
+                print(f"    Large group {candidate_name} failed, trying bisection...")
+                self._try_bisection_removal(symbols_to_remove, self.best_config)
+        return False
+
+    def _accept(self, candidate: ConfigCandidate, removed_symbols: Set[str]):
+        """Make candidate the new best config and record its removed symbols"""
+        self.best_config = candidate
+        names = {sym[7:] if sym.startswith("CONFIG_") else sym for sym in removed_symbols}
+        self._disabled.update(names)
+        self._enabled_y.difference_update(names)
+
     def _try_bisection_removal(self, symbols: Set[str], base_candidate: ConfigCandidate):
         """Try removing smaller subsets using bisection"""
         symbols_list = list(symbols)
@@ -481,37 +939,27 @@ class DICEDebloater:
         # Try first half
         first_half = set(symbols_list[:len(symbols_list)//2])
         if first_half:
-            new_config = base_candidate.config.copy()
-            removed_symbols = set()
-
-            for sym in first_half:
-                config_sym = f"CONFIG_{sym}" if not sym.startswith("CONFIG_") else sym
-                new_config[config_sym] = "n"
-                removed_symbols.add(config_sym)
+            candidate, removed_symbols = self._make_removal_candidate(first_half, base_candidate)
 
             if removed_symbols:
-                candidate = ConfigCandidate(
-                    config=new_config,
-                    disabled_symbols=base_candidate.disabled_symbols | removed_symbols
-                )
-
                 result = self.validator.validate_config(candidate)
                 print(f"      Bisection first half: {result.value}")
 
                 if result == ValidationResult.SUCCESS:
                     candidate.size_reduction = len(removed_symbols)
-                    self.best_config = candidate
+                    self._accept(candidate, removed_symbols)
 
     def save_results(self, output_path: str):
         """Save debloating results"""
+        final_config = self.best_config.full_config()
         results = {
             "base_config_size": len(self.get_current_config()),
-            "final_config_size": len(self.best_config.config),
+            "final_config_size": len(final_config),
             "symbols_removed": len(self.best_config.disabled_symbols),
             "reduction_percentage": (len(self.best_config.disabled_symbols) /
                                    len(self.get_current_config())) * 100,
             "total_tests": len(self.tested_configs),
-            "final_config": dict(self.best_config.config),
+            "final_config": final_config,
             "removed_symbols": list(self.best_config.disabled_symbols)
         }
 
@@ -521,7 +969,7 @@ class DICEDebloater:
         # Also save the final .config
         config_path = Path(output_path).with_suffix('.config')
         with open(config_path, 'w') as f:
-            for symbol, value in self.best_config.config.items():
+            for symbol, value in final_config.items():
                 if value == 'n':
                     f.write(f"# {symbol} is not set\n")
                 else:
@@ -539,19 +987,28 @@ def main():
     parser.add_argument("--base-config", help="Base configuration file")
     parser.add_argument("--output", default="dice_results.json", help="Output file for results")
     parser.add_argument("--max-iterations", type=int, default=50, help="Maximum search iterations")
-    parser.add_argument("--boot-test", help="Command to test kernel boot")
-    parser.add_argument("--runtime-test", help="Command to test runtime functionality")
+    parser.add_argument("--boot-test",
+                        help="Command to test kernel boot; $DICE_BUILD_DIR names the build directory to boot")
+    parser.add_argument("--runtime-test",
+                        help="Command to test runtime functionality; $DICE_BUILD_DIR names the build directory")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Number of candidates to build and test in parallel (each in its own "
+                             "build_<n> directory, passed to the test commands as $DICE_BUILD_DIR)")
+    parser.add_argument("--result-cache",
+                        help="JSON file to persist validation results across runs")
 
     args = parser.parse_args()
 
     # Initialize DICE
-    debloater = DICEDebloater(args.kernel_path, args.base_config)
+    debloater = DICEDebloater(args.kernel_path, args.base_config, jobs=args.jobs)
 
     # Configure validation
     if args.boot_test:
         debloater.validator.boot_test_cmd = args.boot_test
     if args.runtime_test:
         debloater.validator.runtime_test_cmd = args.runtime_test
+    if args.result_cache:
+        debloater.validator.load_result_cache(args.result_cache)
 
     # Run guided search
     try:
@@ -560,7 +1017,7 @@ def main():
 
         print("\nDICE completed successfully!")
         print(f"Original config: {len(debloater.get_current_config())} symbols")
-        print(f"Final config: {len(final_config.config)} symbols")
+        print(f"Final config: {len(final_config.full_config())} symbols")
         print(f"Reduction: {len(final_config.disabled_symbols)} symbols")
 
     except KeyboardInterrupt:
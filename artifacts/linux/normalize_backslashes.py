@@ -15,8 +15,10 @@ Usage:
 Only code-ish file extensions are processed; others are copied as-is.
 """
 import os
+import re
 import shutil
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
 SCAN_EXTS = {
     ".c", ".h", ".S", ".s", ".ld", ".lds", ".dts", ".dtsi", ".asm", ".inc", ".rs"
@@ -24,6 +26,10 @@ SCAN_EXTS = {
 SKIP_DIRS = {".git", ".github", ".gitlab"}
 
 PLACEHOLDER = "/* kconfig-db:join-placeholder */"
+PLACEHOLDER_LINE = PLACEHOLDER + "\n"
+
+# A line whose last non-whitespace character is '\'
+CONT_RE = re.compile(r"\\[^\S\n]*$", re.MULTILINE)
 
 def should_scan_file(path: str) -> bool:
     _, ext = os.path.splitext(path)
@@ -31,42 +37,87 @@ def should_scan_file(path: str) -> bool:
 
 def normalize_file(src_path: str, dst_path: str):
     with open(src_path, "r", encoding="utf-8", errors="ignore") as f:
-        lines = f.readlines()
+        text = f.read()
 
-    out_lines = []
-    i = 0
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()  # trailing newline (or empty file)
     n = len(lines)
-    while i < n:
-        line = lines[i]
-        j = i
-        # Count how many backslash-continued lines follow starting at i
-        # We treat any trailing '\' (possibly with trailing spaces/tabs) as a continuation.
-        buf = line.rstrip("\r\n")
-        cont = 0
-        while buf.rstrip().endswith("\\") and (j + 1) < n:
-            cont += 1
-            # strip the trailing backslash and any trailing whitespace
-            buf = buf.rstrip()
-            buf = buf[:-1].rstrip()  # remove '\' and any spaces before it
-            # append next physical line content
-            j += 1
-            next_line = lines[j].rstrip("\r\n")
-            buf += " " + next_line.lstrip()  # join with a single space
-
-        out_lines.append(buf + "\n")
-        # For each removed newline, add a placeholder line to preserve line count
-        for _ in range(cont):
-            out_lines.append(PLACEHOLDER + "\n")
-
-        i = j + 1
-
-    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-    with open(dst_path, "w", encoding="utf-8", newline="") as f:
-        f.writelines(out_lines)
+
+    with open(dst_path, "w", encoding="utf-8", newline="", buffering=1 << 20) as f:
+        write = f.write
+        i = 0       # first line not yet emitted
+        lineno = 0  # line index of the current match
+        pos = 0
+        # Let the regex engine find continuation lines; only those pay for the per-line join below
+        for m in CONT_RE.finditer(text):
+            lineno += text.count("\n", pos, m.start())
+            pos = m.start()
+            if lineno < i:
+                continue  # already consumed by a previous chain
+            if lineno + 1 >= n:
+                break  # last line: nothing to join with
+
+            # Lines without continuations pass through untouched
+            if lineno > i:
+                write("\n".join(lines[i:lineno]))
+                write("\n")
+
+            j = lineno
+            # We treat any trailing '\' (possibly with trailing spaces/tabs) as a continuation.
+            buf = lines[j]
+            cont = 0
+            while buf.rstrip().endswith("\\") and (j + 1) < n:
+                cont += 1
+                # remove '\' and any whitespace around it
+                buf = buf.rstrip()[:-1].rstrip()
+                # append next physical line content, joined with a single space
+                j += 1
+                buf += " " + lines[j].lstrip()
+
+            write(buf)
+            write("\n")
+            # For each removed newline, add a placeholder line to preserve line count
+            write(PLACEHOLDER_LINE * cont)
+
+            i = j + 1
+
+        if i < n:
+            write("\n".join(lines[i:]))
+            write("\n")
+
+def _copy_file_range(src_path: str, dst_path: str) -> bool:
+    """Copy in-kernel (reflink on btrfs/XFS); False if unsupported for this pair"""
+    with open(src_path, "rb") as fsrc, open(dst_path, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                return False  # e.g. pseudo-files that report a bogus size
+            remaining -= copied
+    return True
 
 def copy_file(src_path: str, dst_path: str):
-    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-    shutil.copy2(src_path, dst_path)
+    copied = False
+    if hasattr(os, "copy_file_range"):
+        try:
+            copied = _copy_file_range(src_path, dst_path)
+        except OSError:
+            pass  # cross-device on old kernels, unsupported fs, ...
+    if not copied:
+        shutil.copyfile(src_path, dst_path)
+    shutil.copystat(src_path, dst_path)
+
+def process_one(task):
+    src_path, dst_path, rel, scan = task
+    if scan:
+        try:
+            normalize_file(src_path, dst_path)
+        except Exception as e:
+            print(f"warn: passthrough {rel} due to error: {e}", file=sys.stderr)
+            copy_file(src_path, dst_path)
+    else:
+        copy_file(src_path, dst_path)
 
 def main():
     if len(sys.argv) != 3:
@@ -79,21 +130,25 @@ def main():
         print(f"error: not a directory: {src_root}", file=sys.stderr)
         sys.exit(1)
 
+    tasks = []
     for dirpath, dirnames, filenames in os.walk(src_root, followlinks=False):
         # prune skip dirs
         dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+        if not filenames:
+            continue
+        # Create destination directories up front so workers never race on makedirs
+        rel_dir = os.path.relpath(dirpath, src_root)
+        os.makedirs(os.path.join(dst_root, rel_dir), exist_ok=True)
         for fn in filenames:
             src_path = os.path.join(dirpath, fn)
-            rel = os.path.relpath(src_path, src_root)
+            rel = os.path.normpath(os.path.join(rel_dir, fn))
             dst_path = os.path.join(dst_root, rel)
-            if should_scan_file(src_path):
-                try:
-                    normalize_file(src_path, dst_path)
-                except Exception as e:
-                    print(f"warn: passthrough {rel} due to error: {e}", file=sys.stderr)
-                    copy_file(src_path, dst_path)
-            else:
-                copy_file(src_path, dst_path)
+            tasks.append((src_path, dst_path, rel, should_scan_file(src_path)))
+
+    # Files are independent; fan them out across cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        for _ in pool.map(process_one, tasks, chunksize=64):
+            pass
 
 if __name__ == "__main__":
     main()
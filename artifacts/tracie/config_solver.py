@@ -9,8 +9,8 @@
 import argparse
 import re
 import sys
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
 
 from pysat.examples.rc2 import RC2
 from pysat.formula import WCNF
@@ -18,121 +18,99 @@ from pysat.formula import WCNF
 # ---- Lexer / Parser ----
 
 TOK_VAR = re.compile(r"CONFIG_[A-Za-z0-9_]+")
-WHITESPACE = set(" \t\r\n")
-
-
-def tokenize(s: str) -> List[str]:
-    out = []
-    i = 0
-    n = len(s)
-    while i < n:
-        c = s[i]
-        if c in WHITESPACE:
-            i += 1
-            continue
-        if s.startswith("&&", i):
-            out.append("&&")
-            i += 2
-            continue
-        if s.startswith("||", i):
-            out.append("||")
-            i += 2
-            continue
-        if c in "!()":
-            out.append(c)
-            i += 1
-            continue
-        m = TOK_VAR.match(s, i)
-        if m:
-            out.append(m.group(0))
-            i = m.end()
-            continue
-        raise ValueError(f"Unexpected token near: {s[i : i + 16]!r}")
-    return out
+# Skip whitespace, then take one token; an empty group 1 is EOF or a bad char
+TOKEN = re.compile(r"[ \t\r\n]*(&&|\|\||[!()]|" + TOK_VAR.pattern + ")?")
 
 
 # Grammar:
 #   expr  := term ( '||' term )*
 #   term  := factor ( '&&' factor )*
 #   factor:= '!' factor | '(' expr ')' | VAR
+#
+# The parser emits the expression in postfix order as two parallel sequences:
+# opcodes, and the variable name for each OP_VAR (None for operators).
 
+OP_VAR, OP_NOT, OP_AND, OP_OR = range(4)
 
-@dataclass
-class Node:
-    pass
-
-
-@dataclass
-class Var(Node):
-    name: str
-
-
-@dataclass
-class Not(Node):
-    a: Node
-
-
-@dataclass
-class And(Node):
-    a: Node
-    b: Node
+Postfix = Tuple[bytearray, List[Optional[str]]]
 
 
-@dataclass
-class Or(Node):
-    a: Node
-    b: Node
+class Parser:
+    """Recursive-descent parser lexing on demand: a cursor into the source
+    plus one token of lookahead. One instance can parse many expressions."""
 
+    def __init__(self):
+        self.src = ""
+        self.pos = 0
+        self.look: Optional[str] = None
+        self.ops = bytearray()
+        self.names: List[Optional[str]] = []
+
+    def _next_tok(self) -> Optional[str]:
+        m = TOKEN.match(self.src, self.pos)
+        self.pos = m.end()
+        tok = m.group(1)
+        if tok is None and self.pos < len(self.src):
+            raise ValueError(f"Unexpected token near: {self.src[self.pos : self.pos + 16]!r}")
+        return tok
 
-class Parser:
-    def __init__(self, tokens: List[str]):
-        self.toks = tokens
-        self.i = 0
+    def emit(self, op: int, name: Optional[str] = None) -> None:
+        self.ops.append(op)
+        self.names.append(name)
 
     def peek(self) -> Optional[str]:
-        return self.toks[self.i] if self.i < len(self.toks) else None
+        return self.look
 
     def eat(self, t: str = None) -> str:
-        if self.i >= len(self.toks):
+        tok = self.look
+        if tok is None:
             raise ValueError("Unexpected end")
-        tok = self.toks[self.i]
         if t is not None and tok != t:
             raise ValueError(f"Expected {t}, got {tok}")
-        self.i += 1
+        self.look = self._next_tok()
         return tok
 
-    def parse(self) -> Node:
-        node = self.expr()
+    def parse(self, src: str) -> Postfix:
+        self.src = src
+        self.pos = 0
+        self.ops = bytearray()
+        self.names = []
+        self.look = self._next_tok()
+        self.expr()
         if self.peek() is not None:
             raise ValueError(f"Extra tokens at end: {self.peek()}")
-        return node
+        return self.ops, self.names
 
-    def expr(self) -> Node:
-        n = self.term()
+    def expr(self) -> None:
+        self.term()
         while self.peek() == "||":
             self.eat("||")
-            n = Or(n, self.term())
-        return n
+            self.term()
+            self.emit(OP_OR)
 
-    def term(self) -> Node:
-        n = self.factor()
+    def term(self) -> None:
+        self.factor()
         while self.peek() == "&&":
             self.eat("&&")
-            n = And(n, self.factor())
-        return n
+            self.factor()
+            self.emit(OP_AND)
 
-    def factor(self) -> Node:
+    def factor(self) -> None:
         t = self.peek()
         if t == "!":
             self.eat("!")
-            return Not(self.factor())
+            self.factor()
+            self.emit(OP_NOT)
+            return
         if t == "(":
             self.eat("(")
-            n = self.expr()
+            self.expr()
             self.eat(")")
-            return n
-        if t and TOK_VAR.fullmatch(t):
-            return Var(self.eat())
+            return
+        if t and t.startswith("CONFIG_"):
+            # Interned, so every later dict lookup on the name hits by identity
+            self.emit(OP_VAR, sys.intern(self.eat()))
+            return
         raise ValueError(f"Bad factor at {t!r}")
 
 
@@ -144,50 +122,185 @@ class Tseitin:
         self.var_ids: Dict[str, int] = {}
         self.rev: Dict[int, str] = {}
         self._next = 1
-        self.clauses: List[List[int]] = []
+        # Clauses as flat DIMACS: literals with a 0 after each clause
+        self.cnf = array("i")
+        # Hash-consing: (op, operand literals) -> gate literal. Operands are
+        # themselves canonical, so equal subformulas share one aux variable;
+        # AND/OR keys are order-free since both are commutative.
+        self.memo: Dict[Tuple[int, ...], int] = {}
+        self._true: Optional[int] = None
 
     def lit(self, name: str) -> int:
-        if name not in self.var_ids:
+        vid = self.var_ids.get(name)
+        if vid is None:
             vid = self._next
             self._next += 1
             self.var_ids[name] = vid
             self.rev[vid] = name
-        return self.var_ids[name]
+        return vid
 
     def fresh(self) -> int:
         vid = self._next
         self._next += 1
         return vid
 
-    def encode(self, node: Node) -> int:
-        if isinstance(node, Var):
-            return self.lit(node.name)
-        if isinstance(node, Not):
-            a = self.encode(node.a)
-            y = self.fresh()
-            # y <-> ~a  ==  (¬y ∨ ¬a) ∧ (y ∨ a)
-            self.clauses += [[-y, -a], [y, a]]
-            return y
-        if isinstance(node, And):
-            a = self.encode(node.a)
-            b = self.encode(node.b)
-            y = self.fresh()
+    def true_lit(self) -> int:
+        """Literal fixed to true by a unit clause; its negation is false."""
+        if self._true is None:
+            self._true = self.fresh()
+            self.cnf.extend((self._true, 0))
+        return self._true
+
+    # Gates fold trivial cases before allocating anything: negation is just
+    # the negated literal (so !!X is X), X op X is X, X op !X and constant
+    # operands reduce to a constant or to the other operand.
+
+    def _enc_not(self, a: int) -> int:
+        return -a
+
+    def _enc_and(self, a: int, b: int) -> int:
+        if a == b:
+            return a
+        t = self._true or 0  # 0 matches no literal
+        if a == -b or a == -t or b == -t:
+            return -self.true_lit()
+        if a == t:
+            return b
+        if b == t:
+            return a
+        key = (OP_AND, a, b) if a < b else (OP_AND, b, a)
+        y = self.memo.get(key)
+        if y is None:
+            y = self.memo[key] = self.fresh()
             # y <-> (a & b) == (¬y ∨ a) ∧ (¬y ∨ b) ∧ (y ∨ ¬a ∨ ¬b)
-            self.clauses += [[-y, a], [-y, b], [y, -a, -b]]
-            return y
-        if isinstance(node, Or):
-            a = self.encode(node.a)
-            b = self.encode(node.b)
-            y = self.fresh()
+            self.cnf.extend((-y, a, 0, -y, b, 0, y, -a, -b, 0))
+        return y
+
+    def _enc_or(self, a: int, b: int) -> int:
+        if a == b:
+            return a
+        t = self._true or 0  # 0 matches no literal
+        if a == -b or a == t or b == t:
+            return self.true_lit()
+        if a == -t:
+            return b
+        if b == -t:
+            return a
+        key = (OP_OR, a, b) if a < b else (OP_OR, b, a)
+        y = self.memo.get(key)
+        if y is None:
+            y = self.memo[key] = self.fresh()
             # y <-> (a | b) == (¬y ∨ a ∨ b) ∧ (y ∨ ¬a) ∧ (y ∨ ¬b)
-            self.clauses += [[-y, a, b], [y, -a], [y, -b]]
-            return y
-        raise TypeError(node)
+            self.cnf.extend((-y, a, b, 0, y, -a, 0, y, -b, 0))
+        return y
+
+    def clauses(self, start: int = 0) -> List[List[int]]:
+        """Split the DIMACS buffer, from offset start, into clause lists."""
+        cnf = self.cnf
+        out = []
+        n = len(cnf)
+        while start < n:
+            end = cnf.index(0, start)
+            out.append(cnf[start:end].tolist())
+            start = end + 1
+        return out
+
+    def encode(self, ops: bytearray, names: List[Optional[str]]) -> int:
+        # Single sweep over the postfix form with a stack of literals; operands
+        # come out left to right, as a recursive descent over the tree would.
+        stack: List[int] = []
+        for op, name in zip(ops, names):
+            if op == OP_VAR:
+                stack.append(self.lit(name))
+            elif op == OP_NOT:
+                stack.append(self._enc_not(stack.pop()))
+            else:
+                b = stack.pop()
+                a = stack.pop()
+                if op == OP_AND:
+                    stack.append(self._enc_and(a, b))
+                else:
+                    stack.append(self._enc_or(a, b))
+        return stack.pop()
 
 
 # ---- Building and solving ----
 
 
+class Session:
+    """
+    Min-true solving that can be resumed: expressions may be added between
+    solve() calls. The RC2 instance stays open, so only the new clauses are
+    fed to it and its cores, totalizers and learnt clauses carry over.
+    """
+
+    def __init__(self, solver: str = "g3"):
+        self.ts = Tseitin()
+        self.parser = Parser()
+        self.solver = solver
+        self.tops: List[int] = []
+        self._rc2: Optional[RC2] = None
+        self._sent_cnf = 0  # prefix of ts.cnf already given to RC2
+        self._sent_tops = 0
+        self._softened: Set[int] = set()
+        self._named: List[Tuple[str, int]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        if self._rc2 is not None:
+            self._rc2.delete()
+            self._rc2 = None
+
+    def add_expr(self, expr: str) -> int:
+        """Require expr to hold; returns its top literal."""
+        ops, names = self.parser.parse(expr)
+        top = self.ts.encode(ops, names)
+        self.tops.append(top)
+        return top
+
+    def named(self) -> List[Tuple[str, int]]:
+        """Named CONFIG vars (no Tseitin aux vars) in name order."""
+        # var_ids only ever grows, so the sorted copy is stale iff it is shorter
+        if len(self._named) != len(self.ts.var_ids):
+            self._named = sorted(self.ts.var_ids.items())
+        return self._named
+
+    def solve(self) -> Optional[List[int]]:
+        """Minimal model over everything added so far, or None if UNSAT."""
+        # Soft clauses: prefer each CONFIG var to be False => (¬X) with weight 1
+        softs = [vid for _, vid in self.named() if vid not in self._softened]
+        if self._rc2 is None:
+            # Build WCNF: hard clauses = Tseitin constraints + [top] for each expression
+            w = WCNF()
+            for c in self.ts.clauses():
+                w.append(c)  # hard
+            for t in self.tops:
+                w.append([t])  # enforce each expression is true
+            for vid in softs:
+                w.append([-vid], weight=1)
+            # Every soft clause has weight 1, so stratification has nothing to
+            # split on. Instead, let RC2 detect AtMost1 groups among the softs
+            # (adapt), exhaust and reduce each core before relaxing it, and
+            # reuse its incremental totalizers for the resulting bounds.
+            self._rc2 = RC2(w, solver=self.solver, adapt=True, exhaust=True, minz=True)
+        else:
+            for c in self.ts.clauses(self._sent_cnf):
+                self._rc2.add_clause(c)
+            for t in self.tops[self._sent_tops :]:
+                self._rc2.add_clause([t])
+            for vid in softs:
+                self._rc2.add_clause([-vid], weight=1)
+        self._sent_cnf = len(self.ts.cnf)
+        self._sent_tops = len(self.tops)
+        self._softened.update(softs)
+        return self._rc2.compute()  # list of ints with signs
+
+
 def main():
     ap = argparse.ArgumentParser(
         description="Min-true CONFIG solver via MaxSAT (PySAT RC2)."
@@ -202,6 +315,11 @@ def main():
         action="store_true",
         help="print full truth assignment, not just true vars",
     )
+    ap.add_argument(
+        "--solver",
+        default="g3",
+        help="SAT solver used by RC2, by PySAT name (default: g3; e.g. cd15, g4, mgh)",
+    )
     args = ap.parse_args()
 
     lines = []
@@ -222,40 +340,23 @@ def main():
         print("No expressions supplied.", file=sys.stderr)
         sys.exit(1)
 
-    ts = Tseitin()
-    tops = []
-    for e in exprs:
-        rpn = tokenize(e)
-        ast = Parser(rpn).parse()
-        top = ts.encode(ast)
-        tops.append(top)
-
-    # Build WCNF: hard clauses = Tseitin constraints + [top] for each expression
-    w = WCNF()
-    for c in ts.clauses:
-        w.append(c)  # hard
-    for t in tops:
-        w.append([t])  # enforce each expression is true
-
-    # Soft clauses: prefer each CONFIG var to be False => add (¬X) with weight 1
-    for name, vid in sorted(ts.var_ids.items(), key=lambda kv: kv[0]):
-        w.append([-vid], weight=1)
-
-    # Solve
-    with RC2(w) as rc2:
-        model = rc2.compute()  # list of ints with signs
+    with Session(solver=args.solver) as session:
+        for e in exprs:
+            session.add_expr(e)
+        model = session.solve()
+    # Named CONFIG vars in name order, for the report
+    named = session.named()
 
     if model is None:
         print("UNSAT — no assignment satisfies all expressions")
         sys.exit(2)
 
     # Extract assignment for the named CONFIG variables (exclude Tseitin aux vars)
-    mset = set(model)
+    true_lits = {lit for lit in model if lit > 0}
     true_vars = []
     full = []
-    max_vid_named = max(ts.var_ids.values()) if ts.var_ids else 0
-    for name, vid in sorted(ts.var_ids.items(), key=lambda kv: kv[0]):
-        val = vid in mset
+    for name, vid in named:
+        val = vid in true_lits
         full.append((name, val))
         if val:
             true_vars.append(name)
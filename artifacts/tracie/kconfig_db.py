@@ -16,55 +16,82 @@ import csv
 import os
 import re
 import sys
-from dataclasses import dataclass, field
-from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
 
 # Extensions to scan
-SCAN_EXTS = {
+SCAN_EXTS = frozenset({
     ".c", ".h", ".S", ".s", ".ld", ".lds", ".dts", ".dtsi", ".asm", ".inc", ".rs"
-}
+})
 
 # Directories to skip
 SKIP_DIRS_DEFAULT = {
     ".git", ".github", ".gitlab", "Documentation", "samples", "usr", "tools/perf/tests",
 }
 
+# Output buffer size for the CSV writer
+OUTPUT_BUFFER = 1 << 20
+
 # Regexes
 RE_CONFIG = re.compile(r"\bCONFIG_[A-Z0-9_]+\b")
-RE_PREPROC = re.compile(r"^\s*#\s*(if|ifdef|ifndef|elif|else|endif)\b(.*)$")
 RE_DEFINED = re.compile(r"\bdefined\s*\(\s*(CONFIG_[A-Z0-9_]+)\s*\)")
 MACROS = ["IS_ENABLED", "IS_REACHABLE", "IS_BUILTIN", "IS_MODULE"]
-RE_MACROS = re.compile(r"\b(" + "|".join(MACROS) + r")\s*\(([^)]*?)\)")
 
-@dataclass
-class Branch:
-    kind: str                 # 'if'|'ifdef'|'ifndef'|'elif'|'else'
-    expr_text: str            # raw text after directive ('' for else)
-    directive_line: int       # line number of the directive itself
-    start_body: int           # first line of body (directive_line + 1)
-    end_body: Optional[int] = None  # inclusive end line of body (set when branch closes)
+def _word_start(word: str) -> str:
+    """Regex for \\bword that begins with a literal, so sre can prefilter on it."""
+    return f"{word[0]}(?<!\\w{word[0]}){word[1:]}"
 
-@dataclass
-class IfStackEntry:
-    branches: List[Branch] = field(default_factory=list)
+# One scan per file, dispatched on m.lastgroup: a preprocessor directive
+# (line start checked by the caller), a macro helper call, defined(CONFIG_*),
+# or a bare CONFIG_* (no group). No alternative crosses a newline.
+# Every alternative leads with a literal, which lets the engine skip straight
+# to the next '#', 'I', 'd' or 'C' instead of trying each branch at every offset.
+# It runs over the raw bytes; only the spans that end up in rows are decoded.
+_MACRO_STEM = os.path.commonprefix(MACROS)
+RE_SCAN = re.compile((
+    r"#[^\S\n]*(?P<directive>if|ifdef|ifndef|elif|else|endif)\b"
+    r"|" + _word_start(_MACRO_STEM) + "(?:" + "|".join(m[len(_MACRO_STEM):] for m in MACROS) + ")"
+    r"(?P<macro>[^\S\n]*\((?P<args>[^)\n]*?)\))"
+    r"|" + _word_start("defined") + r"[^\S\n]*\([^\S\n]*(?P<defined>CONFIG_[A-Z0-9_]+)[^\S\n]*\)"
+    r"|" + _word_start("CONFIG_") + r"[A-Z0-9_]+\b"
+).encode("ascii"))
+# RE_DEFINED over raw bytes, for defined(CONFIG_*) that a macro match swallowed
+RE_DEFINED_BYTES = re.compile(RE_DEFINED.pattern.encode("ascii"))
 
-def should_scan_file(path: str) -> bool:
-    _, ext = os.path.splitext(path)
-    return ext in SCAN_EXTS
+def should_scan_file(name: str) -> bool:
+    dot = name.rfind(".")
+    # Same rule as os.path.splitext: leading dots do not start an extension
+    return dot > 0 and name[dot:] in SCAN_EXTS and name[:dot].lstrip(".") != ""
 
 def iter_files(root, skip_dirs):
+    """
+    Yield (path, path relative to root) for each file to scan, in os.walk
+    top-down order. Directories named in skip_dirs are pruned; symlinked
+    directories are not followed.
+    """
     root = os.path.abspath(root)
-    for dirpath, dirnames, filenames in os.walk(root, followlinks=False):
-        rel = os.path.relpath(dirpath, root)
-        parts = set(rel.split(os.sep)) if rel != "." else set()
-        if parts & {d.strip(os.sep) for d in skip_dirs}:
-            dirnames[:] = []  # prune
+    skip = {d.strip(os.sep) for d in skip_dirs}
+    stack = [(root, "")]
+    while stack:
+        dirpath, rel_dir = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    name = entry.name
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    rel = f"{rel_dir}{os.sep}{name}" if rel_dir else name
+                    if is_dir:
+                        if name not in skip and not entry.is_symlink():
+                            subdirs.append((entry.path, rel))
+                    elif should_scan_file(name):
+                        yield entry.path, rel
+        except OSError:
             continue
-        dirnames[:] = [d for d in dirnames if d not in skip_dirs]
-        for fn in filenames:
-            fp = os.path.join(dirpath, fn)
-            if should_scan_file(fp):
-                yield fp
+        stack.extend(reversed(subdirs))
 
 def extract_configs_from_expr(expr: str):
     """
@@ -75,115 +102,154 @@ def extract_configs_from_expr(expr: str):
         configs.add(dm.group(1))
     return configs
 
-def flush_branch_rows(writer, cfgs, expr, relfp, start_body, end_body):
+def flush_branch_rows(rows, cfgs, expr, relfp, start_body, end_body):
     if end_body is None:
         end_body = start_body  # safety
     for cfg in sorted(cfgs):
-        writer.writerow([cfg, expr, relfp, start_body, end_body])
+        rows.append((cfg, expr, relfp, start_body, end_body))
 
-def process_file(fp: str, relfp: str, writer: csv.writer):
+def _decode(span: bytes) -> str:
+    return span.decode("utf-8", errors="ignore")
+
+def flush_line_rows(rows, found, line, relfp, lineno):
+    snippet = _decode(line).strip()
+    if len(snippet) > 200:
+        snippet = snippet[:197] + "..."
+    for cfg in sorted(found):
+        rows.append((cfg, snippet, relfp, lineno, lineno))
+
+def process_file(fp: str, relfp: str) -> List[Tuple]:
     """
-    Stream a file, maintaining a stack of conditional blocks to compute ranges.
-    Also emit single-line macro occurrences.
+    Scan a file's bytes as one buffer, maintaining a stack of conditional blocks to
+    compute ranges. Also collect single-line macro occurrences. Returns the CSV rows.
     """
-    stack: List[IfStackEntry] = []
-    # We also record macro/single-line occurrences on the fly
-    with open(fp, "r", encoding="utf-8", errors="ignore") as fh:
-        for lineno, line in enumerate(fh, start=1):
-            m = RE_PREPROC.match(line)
-            if m:
-                directive = m.group(1)
-                tail = m.group(2).strip()
-
-                if directive in ("if", "ifdef", "ifndef"):
-                    # Close any currently open branch at this nesting level? No—new nesting starts.
-                    entry = IfStackEntry()
-                    br = Branch(
-                        kind=directive,
-                        expr_text=tail,
-                        directive_line=lineno,
-                        start_body=lineno + 1,
-                    )
-                    entry.branches.append(br)
-                    stack.append(entry)
-
-                elif directive == "elif":
-                    if not stack or not stack[-1].branches:
-                        # Unbalanced; ignore gracefully
-                        continue
-                    # Close previous branch body at the line before this elif
-                    prev = stack[-1].branches[-1]
-                    if prev.end_body is None:
-                        prev.end_body = lineno - 1
-                    # Start new branch
-                    br = Branch(
-                        kind="elif",
-                        expr_text=tail,
-                        directive_line=lineno,
-                        start_body=lineno + 1,
-                    )
-                    stack[-1].branches.append(br)
-
-                elif directive == "else":
-                    if not stack or not stack[-1].branches:
-                        continue
-                    prev = stack[-1].branches[-1]
-                    if prev.end_body is None:
-                        prev.end_body = lineno - 1
-                    br = Branch(
-                        kind="else",
-                        expr_text="",
-                        directive_line=lineno,
-                        start_body=lineno + 1,
-                    )
-                    stack[-1].branches.append(br)
-
-                elif directive == "endif":
-                    if not stack:
-                        continue
-                    # Close the current branch at line before #endif
-                    curr_entry = stack[-1]
-                    if curr_entry.branches:
-                        last = curr_entry.branches[-1]
-                        if last.end_body is None:
-                            last.end_body = lineno - 1
-                    # Emit rows for all branches of this if-block
-                    for br in curr_entry.branches:
-                        # build a readable expression string
-                        expr_str = f"#{br.kind} {br.expr_text}".strip()
-                        cfgs = extract_configs_from_expr(expr_str)
-                        if cfgs:
-                            flush_branch_rows(writer, cfgs, expr_str, relfp, br.start_body, br.end_body)
-                    # Pop the if-block
-                    stack.pop()
-
-                # Regardless of directive, also continue to next line
+    rows: List[Tuple] = []
+    # Open #if blocks as a pushdown of parallel per-branch arrays: kind
+    # ('if'|'ifdef'|'ifndef'|'elif'|'else'), raw directive text ('' for
+    # else), first and last (inclusive, None while open) line of the body.
+    # block_starts holds the index of each open block's first branch.
+    kinds: List[str] = []
+    exprs: List[str] = []
+    starts: List[int] = []
+    ends: List[Optional[int]] = []
+    block_starts: List[int] = []
+    with open(fp, "rb") as fh:
+        data = fh.read()
+    # Every row names a CONFIG_* taken from the file itself, so a file without
+    # one has nothing to emit, however many directives it contains.
+    if b"CONFIG_" not in data:
+        return rows
+
+    # Only lines with a match are visited; line numbers are advanced by
+    # counting the newlines skipped since the previous matched line.
+    lineno = 1
+    pos = 0
+    line_start = 0
+    line_end = -1
+    directive_line = False
+    found = set()
+    defined = set()
+    for m in RE_SCAN.finditer(data):
+        start = m.start()
+        if start > line_end:
+            # Generic single-line CONFIG_* mentions (fallback) of the previous line.
+            # Avoid double-counting defined(CONFIG_X) which are covered by #if branches.
+            found -= defined
+            if found:
+                flush_line_rows(rows, found, data[line_start:line_end], relfp, lineno)
+                found.clear()
+            defined.clear()
+            lineno += data.count(b"\n", pos, start)
+            pos = start
+            line_start = data.rfind(b"\n", 0, start) + 1
+            line_end = data.find(b"\n", start)
+            if line_end < 0:
+                line_end = len(data)
+            directive_line = False
+        elif directive_line:
+            # Nothing else on a directive line is a single-line occurrence
+            continue
+
+        kind = m.lastgroup
+        if kind == "directive":
+            if start > line_start and not data[line_start:start].isspace():
+                # A '#' after other text on the line is not a directive
                 continue
+            directive_line = True
+            directive = m.group("directive").decode("ascii")
+            tail = _decode(data[m.end():line_end]).strip()
+
+            if directive in ("if", "ifdef", "ifndef"):
+                # New nesting level: its branches start at the end of the arrays
+                block_starts.append(len(kinds))
+                kinds.append(directive)
+                exprs.append(tail)
+                starts.append(lineno + 1)
+                ends.append(None)
 
-            # Macro helpers like IS_ENABLED(CONFIG_FOO)
-            if any(macro in line for macro in MACROS):
-                for mm in RE_MACROS.finditer(line):
-                    macro = mm.group(1)
-                    args = mm.group(2)
-                    cfgs = extract_configs_from_expr(args)
+            elif directive in ("elif", "else"):
+                if not block_starts:
+                    # Unbalanced; ignore gracefully
+                    continue
+                # Close previous branch body at the line before this directive;
+                # the innermost open block always owns the last branch.
+                if ends[-1] is None:
+                    ends[-1] = lineno - 1
+                kinds.append(directive)
+                exprs.append(tail if directive == "elif" else "")
+                starts.append(lineno + 1)
+                ends.append(None)
+
+            elif directive == "endif":
+                if not block_starts:
+                    continue
+                # Close the current branch at line before #endif
+                if ends[-1] is None:
+                    ends[-1] = lineno - 1
+                # Emit rows for all branches of this if-block, then pop it
+                first = block_starts.pop()
+                for i in range(first, len(kinds)):
+                    # build a readable expression string
+                    expr_str = f"#{kinds[i]} {exprs[i]}".strip()
+                    cfgs = extract_configs_from_expr(expr_str)
                     if cfgs:
-                        expr = f"{macro}({args})"
-                        for cfg in sorted(cfgs):
-                            writer.writerow([cfg, expr, relfp, lineno, lineno])
-
-            # Generic single-line CONFIG_* mentions (fallback)
-            if "CONFIG_" in line:
-                # Skip if already accounted via macros; still OK if duplicated—but we can de-dupe per line.
-                found = set(RE_CONFIG.findall(line))
-                if found:
-                    snippet = line.strip()
-                    if len(snippet) > 200:
-                        snippet = snippet[:197] + "..."
-                    for cfg in sorted(found):
-                        # Avoid double-counting defined(CONFIG_X) which are covered by #if branches.
-                        if f"defined({cfg})" in line.replace(" ", ""):
-                            continue
-                        writer.writerow([cfg, snippet, relfp, lineno, lineno])
+                        flush_branch_rows(rows, cfgs, expr_str, relfp, starts[i], ends[i])
+                del kinds[first:], exprs[first:], starts[first:], ends[first:]
+
+        elif kind is None:
+            found.add(m.group().decode("ascii"))
+        elif kind == "defined":
+            cfg = m.group(kind).decode("ascii")
+            found.add(cfg)
+            defined.add(cfg)
+        elif kind == "macro":
+            # Macro helpers like IS_ENABLED(CONFIG_FOO) are emitted as they are
+            # found; their CONFIG_* arguments also feed the generic fallback.
+            args = _decode(m.group("args"))
+            cfgs = extract_configs_from_expr(args)
+            if cfgs:
+                expr = f"{data[start:m.start(kind)].decode('ascii')}({args})"
+                for cfg in sorted(cfgs):
+                    rows.append((cfg, expr, relfp, lineno, lineno))
+                found |= cfgs
+                # A defined(CONFIG_*) starting inside the arguments is never seen
+                # by RE_SCAN, but still keeps its CONFIG_* out of the fallback rows
+                if b"defined" in m.group("args"):
+                    for dm in RE_DEFINED_BYTES.finditer(data, m.start("args"), line_end):
+                        defined.add(dm.group(1).decode("ascii"))
+
+    found -= defined
+    if found:
+        flush_line_rows(rows, found, data[line_start:line_end], relfp, lineno)
+    return rows
+
+def process_file_worker(task):
+    """Pool entry point: (fp, relfp) -> (fp, rows, error message or None)"""
+    fp, relfp = task
+    try:
+        return fp, process_file(fp, relfp), None
+    except (OSError, UnicodeDecodeError) as e:
+        return fp, [], str(e)
 
 def main():
     ap = argparse.ArgumentParser(description="Build a CSV mapping CONFIG_* references (with ranges for preprocessor branches).")
@@ -191,7 +257,11 @@ def main():
     ap.add_argument("-o", "--output", help="Output CSV file (default: stdout)")
     ap.add_argument("--skip-dir", action="append", default=[],
                     help=f"Directory name to skip (repeatable). Default skips: {', '.join(sorted(SKIP_DIRS_DEFAULT))}")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                    help="Number of worker processes (default: number of CPUs)")
     args = ap.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        ap.error(f"--jobs must be at least 1, got {args.jobs}")
 
     src_root = os.path.abspath(args.src)
     if not os.path.isdir(src_root):
@@ -200,22 +270,28 @@ def main():
 
     skip_dirs = set(SKIP_DIRS_DEFAULT) | set(args.skip_dir)
 
-    out_fh = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    # Rows arrive in per-file batches; a large buffer turns them into few writes.
+    if args.output:
+        out_fh = open(args.output, "w", newline="", encoding="utf-8", buffering=OUTPUT_BUFFER)
+    else:
+        out_fh = open(sys.stdout.fileno(), "w", newline="", encoding="utf-8",
+                      buffering=OUTPUT_BUFFER, closefd=False)
     writer = csv.writer(out_fh)
     writer.writerow(["CONFIG_name", "CONFIG_expression", "Source File", "Start Line", "End Line"])
 
     total_files = 0
+    tasks = iter_files(src_root, skip_dirs)
     try:
-        for fp in iter_files(src_root, skip_dirs):
-            total_files += 1
-            relfp = os.path.relpath(fp, src_root)
-            try:
-                process_file(fp, relfp, writer)
-            except (OSError, UnicodeDecodeError) as e:
-                print(f"warn: skipping {fp}: {e}", file=sys.stderr)
+        # Files are independent: fan them out, keep the single writer here.
+        # map() yields in submission order, so the CSV stays deterministic.
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            for fp, rows, error in pool.map(process_file_worker, tasks, chunksize=64):
+                total_files += 1
+                if error is not None:
+                    print(f"warn: skipping {fp}: {error}", file=sys.stderr)
+                writer.writerows(rows)
     finally:
-        if out_fh is not sys.stdout:
-            out_fh.close()
+        out_fh.close()
 
     print(f"Scanned {total_files} files.", file=sys.stderr)
 